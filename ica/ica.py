@@ -1,8 +1,13 @@
 import json
+import os
+import sys
 import numpy as np
 import mne
 from mne.preprocessing import ICA 
 from mne_icalabel import label_components
+# storage.py lives in the repository root, shared with the windows/ scripts
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from storage import save_compact
 
 def ica(filename):
     with open(json_file, 'r') as f:
@@ -85,8 +90,16 @@ def ica(filename):
 
 if __name__ == "__main__":
     # 10. Save normalized EEG
+    # Set storage_dtype to "float32", "float16" or "int16" to use the compact
+    # chunked format from storage.py instead of a float64 .npy file.
+    storage_dtype = None
+    codec = None  # or "zlib" for lossless compression of the chunks
     for i in range(1,10):
         json_file = f'HS_P1_S{i}_processed.json'
         normalized_eeg = ica(json_file)
-        np.save(f"HS_P1_S{i}_eeg.npy", normalized_eeg)
-        print("Normalized EEG saved to 'HS_P1_S{i}_eeg.npy'")
+        if storage_dtype is None:
+            np.save(f"HS_P1_S{i}_eeg.npy", normalized_eeg)
+            print(f"Normalized EEG saved to 'HS_P1_S{i}_eeg.npy'")
+        else:
+            save_compact(f"HS_P1_S{i}_eeg", normalized_eeg, dtype=storage_dtype, codec=codec)
+            print(f"Normalized EEG saved to 'HS_P1_S{i}_eeg' ({storage_dtype})")
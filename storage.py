@@ -0,0 +1,178 @@
+import json
+import os
+import zlib
+from collections import OrderedDict
+import numpy as np
+
+# Supported storage dtypes for cleaned EEG recordings
+STORAGE_DTYPES = ("float32", "float16", "int16")
+CODECS = (None, "zlib")
+
+
+def quantize(eeg, dtype):
+    """
+    Computes per-channel scale/offset and converts the EEG data to the storage dtype.
+
+    Parameters:
+        eeg (np.ndarray): 2D array (channels x samples).
+        dtype (str): One of "float32", "float16" or "int16".
+
+    Returns:
+        stored (np.ndarray): Data in the storage dtype.
+        scale (np.ndarray): Per-channel scale, shape (channels,).
+        offset (np.ndarray): Per-channel offset, shape (channels,).
+    """
+    if dtype not in STORAGE_DTYPES:
+        raise ValueError(f"Unsupported storage dtype '{dtype}', expected one of {STORAGE_DTYPES}.")
+    eeg = np.asarray(eeg, dtype=np.float64)
+    n_channels = eeg.shape[0]
+
+    if dtype == "float32":
+        scale = np.ones(n_channels)
+        offset = np.zeros(n_channels)
+        stored = eeg.astype(np.float32)
+    elif dtype == "float16":
+        # Center and scale each channel so values sit where float16 is most precise
+        offset = eeg.mean(axis=1)
+        scale = eeg.std(axis=1)
+        scale[scale < 1e-6] = 1e-6
+        stored = ((eeg - offset[:, None]) / scale[:, None]).astype(np.float16)
+    else:
+        # Map each channel's [min, max] range onto the full int16 range
+        lo = eeg.min(axis=1)
+        hi = eeg.max(axis=1)
+        offset = (hi + lo) / 2
+        scale = (hi - lo) / (2 * 32767)
+        scale[scale < 1e-12] = 1e-12
+        stored = np.clip(np.round((eeg - offset[:, None]) / scale[:, None]), -32767, 32767).astype(np.int16)
+    return stored, scale.astype(np.float32), offset.astype(np.float32)
+
+
+def save_compact(path, eeg, dtype="float16", chunk_samples=5000, codec=None):
+    """
+    Saves a cleaned EEG recording in a compact chunked format.
+
+    The recording is stored as a directory with a meta.json file (shape, dtype,
+    per-channel scale/offset, chunking and codec) and one file per chunk of
+    chunk_samples time points. Uncompressed chunks are plain .npy files that can
+    be memory-mapped; with codec="zlib" chunks are losslessly compressed.
+
+    Parameters:
+        path (str): Output directory.
+        eeg (np.ndarray): 2D array (channels x samples).
+        dtype (str): Storage dtype, one of "float32", "float16" or "int16".
+        chunk_samples (int): Number of time points per chunk.
+        codec (str or None): None for raw .npy chunks, or "zlib".
+    """
+    if codec not in CODECS:
+        raise ValueError(f"Unsupported codec '{codec}', expected one of {CODECS}.")
+    if chunk_samples <= 0:
+        raise ValueError(f"chunk_samples must be positive, got {chunk_samples}.")
+    stored, scale, offset = quantize(eeg, dtype)
+    n_channels, n_times = stored.shape
+    os.makedirs(path, exist_ok=True)
+
+    n_chunks = (n_times + chunk_samples - 1) // chunk_samples
+    for c in range(n_chunks):
+        chunk = np.ascontiguousarray(stored[:, c * chunk_samples:(c + 1) * chunk_samples])
+        if codec is None:
+            np.save(os.path.join(path, f"chunk_{c:05d}.npy"), chunk)
+        else:
+            with open(os.path.join(path, f"chunk_{c:05d}.zlib"), "wb") as f:
+                f.write(zlib.compress(chunk.tobytes()))
+
+    meta = {
+        "shape": [n_channels, n_times],
+        "dtype": dtype,
+        "chunk_samples": chunk_samples,
+        "n_chunks": n_chunks,
+        "codec": codec,
+        "scale": scale.tolist(),
+        "offset": offset.tolist(),
+    }
+    with open(os.path.join(path, "meta.json"), "w") as f:
+        json.dump(meta, f, indent=4)
+
+
+def is_compact(path):
+    """Returns True if path is a recording directory written by save_compact()."""
+    return os.path.isfile(os.path.join(path, "meta.json"))
+
+
+class CompactEEGReader:
+    """
+    Reads recordings written by save_compact() and dequantizes slices
+    directly into float32 arrays or tensors.
+
+    Uncompressed chunks are memory-mapped; for zlib chunks only the
+    max_cached_chunks most recently used decompressed chunks are kept.
+    """
+    def __init__(self, path, max_cached_chunks=4):
+        self.path = path
+        with open(os.path.join(path, "meta.json"), "r") as f:
+            meta = json.load(f)
+        self.shape = tuple(meta["shape"])
+        self.dtype = np.dtype(meta["dtype"])
+        self.chunk_samples = meta["chunk_samples"]
+        self.n_chunks = meta["n_chunks"]
+        self.codec = meta["codec"]
+        self.scale = np.asarray(meta["scale"], dtype=np.float32)[:, None]
+        self.offset = np.asarray(meta["offset"], dtype=np.float32)[:, None]
+        self.max_cached_chunks = max_cached_chunks
+        self._mmaps = {}  # memory-mapped chunks, loaded on first use
+        self._decompressed = OrderedDict()  # LRU cache of decompressed chunks
+
+    def __len__(self):
+        return self.shape[1]
+
+    def _chunk(self, c):
+        if self.codec is None:
+            if c not in self._mmaps:
+                self._mmaps[c] = np.load(os.path.join(self.path, f"chunk_{c:05d}.npy"), mmap_mode="r")
+            return self._mmaps[c]
+
+        if c in self._decompressed:
+            self._decompressed.move_to_end(c)
+            return self._decompressed[c]
+        with open(os.path.join(self.path, f"chunk_{c:05d}.zlib"), "rb") as f:
+            raw = zlib.decompress(f.read())
+        n_times = min(self.chunk_samples, self.shape[1] - c * self.chunk_samples)
+        chunk = np.frombuffer(raw, dtype=self.dtype).reshape(self.shape[0], n_times)
+        if self.max_cached_chunks > 0:
+            self._decompressed[c] = chunk
+            while len(self._decompressed) > self.max_cached_chunks:
+                self._decompressed.popitem(last=False)
+        return chunk
+
+    def read(self, start, stop, out=None):
+        """
+        Returns samples [start, stop) of all channels as float32 (channels x samples).
+        If out is given, the result is written into it instead of a new array.
+        """
+        if not 0 <= start <= stop <= self.shape[1]:
+            raise IndexError(f"Slice [{start}, {stop}) out of range for recording of length {self.shape[1]}.")
+        if out is None:
+            out = np.empty((self.shape[0], stop - start), dtype=np.float32)
+        elif out.shape != (self.shape[0], stop - start) or out.dtype != np.float32:
+            raise ValueError(f"out must be a float32 array of shape {(self.shape[0], stop - start)}, "
+                             f"got {out.dtype} array of shape {out.shape}.")
+        pos = start
+        while pos < stop:
+            c = pos // self.chunk_samples
+            chunk_start = c * self.chunk_samples
+            end = min(stop, chunk_start + self.chunk_samples)
+            dst = out[:, pos - start:end - start]
+            # Dequantize in place: dst = stored * scale + offset
+            np.multiply(self._chunk(c)[:, pos - chunk_start:end - chunk_start], self.scale, out=dst)
+            np.add(dst, self.offset, out=dst)
+            pos = end
+        return out
+
+    def read_tensor(self, start, stop):
+        """Same as read(), but returns a float32 torch tensor sharing the array's memory."""
+        import torch  # only needed here, so writing recordings does not require PyTorch
+        return torch.from_numpy(self.read(start, stop))
+
+    def to_array(self):
+        """Dequantizes the whole recording into a float32 array (channels x samples)."""
+        return self.read(0, self.shape[1])
@@ -44,8 +44,9 @@ class EEGSequenceDataset(Dataset):
     def __getitem__(self, idx):
         # Retrieve the past and future sequences for the given index
         past_np, future_np = self.sequences[idx]
-        past = torch.from_numpy(past_np.astype(np.float32))
-        future = torch.from_numpy(future_np.astype(np.float32))
+        # No copy when the windows are already float32 (e.g. read from compact storage)
+        past = torch.from_numpy(np.asarray(past_np, dtype=np.float32))
+        future = torch.from_numpy(np.asarray(future_np, dtype=np.float32))
         if self.normalize:
             # Normalize the data using the computed means and standard deviations
             past = (past - self.means) / self.stds
@@ -0,0 +1,271 @@
+import numpy as np
+import json
+import os
+import re
+import sys
+from collections import OrderedDict
+from fractions import Fraction
+from scipy.signal import resample_poly
+import torch
+from torch.utils.data import Dataset
+
+# storage.py lives in the repository root, shared with the ica/ scripts
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from storage import CompactEEGReader, is_compact
+
+# LRU cache of whole recordings already resampled to a given rate, keyed by
+# (path, modality, source rate, target rate), so each recording is resampled
+# only once. Only the MAX_CACHED_RECORDINGS most recently used are kept.
+MAX_CACHED_RECORDINGS = 8
+_resampled_cache = OrderedDict()
+
+
+def _cache_get(key):
+    if key not in _resampled_cache:
+        return None
+    _resampled_cache.move_to_end(key)
+    return _resampled_cache[key]
+
+
+def _cache_put(key, recording):
+    _resampled_cache[key] = recording
+    while len(_resampled_cache) > MAX_CACHED_RECORDINGS:
+        _resampled_cache.popitem(last=False)
+
+
+def clear_cache():
+    """Drops all cached resampled recordings."""
+    _resampled_cache.clear()
+
+
+def resample_recording(data, orig_rate, target_rate):
+    """
+    Resamples a whole recording with polyphase filtering.
+
+    Parameters:
+    data (np.ndarray): 2D array (channels x samples).
+    orig_rate (float): Sampling rate of the input data (Hz).
+    target_rate (float): Desired sampling rate (Hz).
+
+    Returns:
+    np.ndarray: Resampled data (channels x resampled samples), float32.
+    """
+    ratio = Fraction(target_rate).limit_denominator(1000) / Fraction(orig_rate).limit_denominator(1000)
+    up, down = ratio.numerator, ratio.denominator
+    if up == down:
+        return np.ascontiguousarray(data, dtype=np.float32)
+    # resample_poly works on all channels at once along the time axis
+    resampled = resample_poly(data, up, down, axis=1)
+    return np.ascontiguousarray(resampled, dtype=np.float32)
+
+
+def load_modalities(hs_path, rates):
+    """
+    Loads several modalities (e.g. "EMG", "KIN") from an HS JSON file written
+    by hstopy.py and resamples each whole recording to its target rate. The
+    file is parsed once for all requested modalities and the resampled
+    recordings are cached so repeated calls do not load or resample again.
+    Raises ValueError if a requested section is empty or has no sampling
+    rate (the fallback written by hstopy.py when extraction fails).
+
+    Parameters:
+    hs_path (str): Path to the HS JSON file.
+    rates (dict): Maps each modality key in the JSON file to its target rate (Hz).
+
+    Returns:
+    recordings (dict): Maps each modality to an array (channels x samples) at its target rate.
+    """
+    path = os.path.abspath(hs_path)
+    recordings = {}
+    for modality, rate in rates.items():
+        # The source rate is only known after parsing, so HS entries are keyed without it
+        cached = _cache_get((path, modality, None, rate))
+        if cached is not None:
+            recordings[modality] = cached
+    missing = [m for m in rates if m not in recordings]
+    if missing:
+        with open(hs_path, 'r') as f:
+            hs_data = json.load(f)
+        for modality in missing:
+            section = hs_data.get(modality)
+            if not section or not section.get("data") or not section.get("sampling_rate"):
+                raise ValueError(f"Modality {modality} in {hs_path} has no data or no sampling rate.")
+            # hstopy.py stores signals as (samples x channels); transpose to (channels x samples)
+            data = np.asarray(section["data"], dtype=np.float64).T
+            recordings[modality] = resample_recording(data, section["sampling_rate"], rates[modality])
+        del hs_data
+        for modality in missing:
+            _cache_put((path, modality, None, rates[modality]), recordings[modality])
+    return recordings
+
+
+def load_eeg(eeg_path, eeg_rate, target_rate):
+    """
+    Loads a cleaned EEG recording (.npy or a compact recording directory,
+    channels x samples) and resamples it to target_rate, using the same cache
+    as load_modalities().
+    """
+    key = (os.path.abspath(eeg_path), "EEG", eeg_rate, target_rate)
+    recording = _cache_get(key)
+    if recording is None:
+        if is_compact(eeg_path):
+            eeg = CompactEEGReader(eeg_path).to_array()
+        else:
+            eeg = np.load(eeg_path)
+        recording = resample_recording(eeg, eeg_rate, target_rate)
+        _cache_put(key, recording)
+    return recording
+
+
+def multimodal_windows(eeg_folder, hs_folder, filename, modalities=("EMG", "KIN"),
+                       target_rate=500, eeg_rate=500, past_sec=2.0, future_sec=3.0,
+                       participant=None):
+    """
+    Function to extract time-aligned EEG, EMG and kinematics windows around
+    LEDOn events.
+
+    Every modality is resampled once per recording, then a window
+    [t - past_sec, t + future_sec) is cut around each LEDOn event.
+
+    Note that with a single target_rate of 500 Hz the 4 kHz EMG is low-passed
+    at 250 Hz by the resampling, which removes much of the surface-EMG band.
+    Pass a dict such as {"EEG": 500, "EMG": 2000, "KIN": 500} to keep a higher
+    rate for EMG; windows then cover the same time span at different lengths.
+
+    Parameters:
+    eeg_folder (str): Directory containing cleaned EEG .npy files.
+    hs_folder (str): Directory containing HS JSON files (HS_P<p>_S<s>.json, see hstopy.py).
+    filename (str): JSON file containing marker data (e.g. P1_AllLifts.json).
+    modalities (tuple): Modalities to extract besides EEG.
+    target_rate (float or dict): Common sampling rate of all windows (Hz), or
+        a dict mapping "EEG" and each modality to its own rate.
+    eeg_rate (float): Sampling rate of the cleaned EEG files (Hz).
+    past_sec (float): Seconds before the event.
+    future_sec (float): Seconds after the event.
+    participant (int or None): Participant whose HS files are used. If None,
+        it is taken from the marker file name (e.g. P1_AllLifts.json).
+
+    Returns:
+    batch (dict): Contiguous float32 arrays of shape (events x channels x samples)
+        under "EEG" and each requested modality, plus "run" and "event_time"
+        (LEDOn, seconds) arrays and, under "past_samples", a dict with the
+        number of past samples of each modality.
+    """
+    keys = ("EEG",) + tuple(modalities)
+    if isinstance(target_rate, dict):
+        rates = {key: target_rate[key] for key in keys}
+    else:
+        rates = {key: target_rate for key in keys}
+
+    with open(filename, 'r') as f:
+        marker_data = json.load(f)
+    columns = marker_data["columns"]
+    data_rows = marker_data["data"]
+
+    # Build a dictionary mapping run numbers to LEDOn times (seconds).
+    markers_by_run = {}
+    for row in data_rows:
+        run = int(row[columns.index("Run")])
+        led_on_sec = row[columns.index("LEDOn")]
+        if led_on_sec is None:
+            continue
+        markers_by_run.setdefault(run, []).append(led_on_sec)
+
+    if participant is None:
+        m = re.match(r'P(\d+)_', os.path.basename(filename))
+        if not m:
+            raise ValueError(f"Could not extract participant from {filename}; pass participant explicitly.")
+        participant = int(m.group(1))
+
+    # Map run numbers to the raw HS files of this participant (e.g. HS_P1_S3.json).
+    # The exact match skips other participants and derived files such as HS_P1_S3_processed.json.
+    hs_by_run = {}
+    for hs_filename in os.listdir(hs_folder):
+        m = re.fullmatch(r'HS_P(\d+)_S(\d+)\.json', hs_filename)
+        if m and int(m.group(1)) == participant:
+            hs_by_run[int(m.group(2))] = os.path.join(hs_folder, hs_filename)
+
+    past_n = {key: int(round(past_sec * rates[key])) for key in keys}
+    future_n = {key: int(round(future_sec * rates[key])) for key in keys}
+
+    # Cut the windows of each run right away so its whole recordings can be
+    # released (or evicted from the cache) before the next run is loaded.
+    windows_by_key = {key: [] for key in keys}
+    events = []
+    for eeg_filename in sorted(os.listdir(eeg_folder)):
+        eeg_path = os.path.join(eeg_folder, eeg_filename)
+        if not (eeg_filename.endswith('.npy') or is_compact(eeg_path)):
+            continue
+        m = re.search(r'_S(\d+)', eeg_filename)
+        if not m:
+            print(f"Could not extract run number from file name {eeg_filename}.")
+            continue
+        run = int(m.group(1))
+        if run not in markers_by_run:
+            print(f"No markers found for run {run} in {filename}.")
+            continue
+        if run not in hs_by_run:
+            print(f"No HS file found for run {run} in {hs_folder}.")
+            continue
+
+        try:
+            recordings = {"EEG": load_eeg(eeg_path, eeg_rate, rates["EEG"])}
+            recordings.update(load_modalities(hs_by_run[run], {key: rates[key] for key in modalities}))
+        except ValueError as e:
+            print(f"Skipping run {run}: {e}")
+            continue
+
+        for led_on_sec in markers_by_run[run]:
+            starts = {key: int(led_on_sec * rates[key]) - past_n[key] for key in keys}
+            if all(starts[key] >= 0 and starts[key] + past_n[key] + future_n[key] <= recordings[key].shape[1]
+                   for key in keys):
+                events.append((run, led_on_sec))
+                for key in keys:
+                    start = starts[key]
+                    windows_by_key[key].append(recordings[key][:, start:start + past_n[key] + future_n[key]].copy())
+            else:
+                print(f"Skipping event at {led_on_sec} s in run {run}: window out of bounds.")
+
+        del recordings
+
+    batch = {}
+    for key in keys:
+        if windows_by_key[key]:
+            batch[key] = np.stack(windows_by_key[key])
+        else:
+            batch[key] = np.empty((0, 0, past_n[key] + future_n[key]), dtype=np.float32)
+    batch["run"] = np.array([event[0] for event in events], dtype=np.int64)
+    batch["event_time"] = np.array([event[1] for event in events], dtype=np.float64)
+    batch["past_samples"] = past_n
+    return batch
+
+
+class MultimodalWindowDataset(Dataset):
+    """
+    Dataset over the output of multimodal_windows(). Each item is a dict of
+    float32 tensors: the past EEG window under "EEG_past" and the future
+    window of every modality under "<modality>_future". By default every
+    modality present in the batch is used.
+    """
+    def __init__(self, batch, modalities=None):
+        self.past_n = batch["past_samples"]
+        if modalities is None:
+            modalities = tuple(self.past_n)
+        self.eeg = torch.from_numpy(batch["EEG"])
+        self.modalities = {key: torch.from_numpy(batch[key]) for key in modalities}
+
+    def __len__(self):
+        return self.eeg.shape[0]
+
+    def __getitem__(self, idx):
+        item = {"EEG_past": self.eeg[idx, :, :self.past_n["EEG"]]}
+        for key, data in self.modalities.items():
+            item[f"{key}_future"] = data[idx, :, self.past_n[key]:]
+        return item
+
+
+if __name__ == "__main__":
+    batch = multimodal_windows("data", "data", "P1_AllLifts.json")
+    print(f"Collected {batch['EEG'].shape[0]} aligned multimodal windows.")
+    for key in ("EEG", "EMG", "KIN"):
+        print(f"{key} windows shape: {batch[key].shape}")
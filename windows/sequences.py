@@ -2,6 +2,11 @@ import numpy as np
 import json
 import os
 import re
+import sys
+
+# storage.py lives in the repository root, shared with the ica/ scripts
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+from storage import CompactEEGReader, is_compact
 
 def windows(folder, filename):
     """
@@ -43,10 +48,11 @@ def windows(folder, filename):
     # This list will hold all (past, future) pairs from all EEG series
     all_sequences = []
 
-    # Iterate through EEG files and extract run number using regex.
+    # Iterate through EEG files (.npy or compact recording directories written
+    # by storage.save_compact) and extract run number using regex.
     for eeg_filename in os.listdir(eeg_dir):
-        if eeg_filename.endswith('.npy'):
-            eeg_path = os.path.join(eeg_dir, eeg_filename)
+        eeg_path = os.path.join(eeg_dir, eeg_filename)
+        if eeg_filename.endswith('.npy') or is_compact(eeg_path):
             
             # Use regex to extract the run number from the filename.
             m = re.search(r'_S(\d+)', eeg_filename)
@@ -57,7 +63,10 @@ def windows(folder, filename):
                 continue
             
             # Load the EEG data; expected shape: [32, N_samples]
-            eeg_data = np.load(eeg_path)
+            if is_compact(eeg_path):
+                eeg_data = CompactEEGReader(eeg_path)
+            else:
+                eeg_data = np.load(eeg_path)
             
             # Process LEDOn events for this run
             if run not in markers_by_run:
@@ -67,8 +76,13 @@ def windows(folder, filename):
             for t in markers_by_run[run]:
                 # Ensure the window [t-1000, t+1500) is within the valid range
                 if t - 1000 >= 0 and t + 1500 <= eeg_data.shape[1]:
-                    past_window = eeg_data[:, t - 1000:t]      # 1000 samples (2 seconds before event)
-                    future_window = eeg_data[:, t:t + 1500]      # 1500 samples (3 seconds after event)
+                    if isinstance(eeg_data, CompactEEGReader):
+                        # Dequantize the whole window once, straight into float32
+                        window = eeg_data.read(t - 1000, t + 1500)
+                        past_window, future_window = window[:, :1000], window[:, 1000:]
+                    else:
+                        past_window = eeg_data[:, t - 1000:t]      # 1000 samples (2 seconds before event)
+                        future_window = eeg_data[:, t:t + 1500]      # 1500 samples (3 seconds after event)
                     all_sequences.append((past_window, future_window))
                 else:
                     print(f"Skipping event at sample {t} in run {run}: window out of bounds.")
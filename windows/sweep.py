@@ -0,0 +1,270 @@
+import numpy as np
+import os
+import csv
+import glob
+import time
+import itertools
+from concurrent.futures import ProcessPoolExecutor
+import torch
+import torch.nn as nn
+from sequences import windows
+from wave_1 import WaveNetForecaster
+
+
+def prepare_shared_dataset(folder, filename, out_dir, train_fraction=0.8, seed=0):
+    """
+    Runs windows() once, normalizes with training-set statistics and writes the
+    windows to .npy files that every trial memory-maps read-only.
+
+    Parameters:
+    folder (str): Directory containing EEG files.
+    filename (str): JSON file containing marker data.
+    out_dir (str): Directory where the shared arrays are written.
+    train_fraction (float): Fraction of windows used for training.
+    seed (int): Seed of the train/validation shuffle.
+
+    Returns:
+    paths (dict): Paths of the "train_past", "train_future", "val_past" and "val_future" arrays.
+    """
+    all_sequences = windows(folder, filename)
+    rng = np.random.default_rng(seed)
+    order = rng.permutation(len(all_sequences))
+    split_idx = int(train_fraction * len(all_sequences))
+    if split_idx == 0 or split_idx == len(all_sequences):
+        raise ValueError(f"{len(all_sequences)} windows with train_fraction={train_fraction} leave "
+                         f"{split_idx} training and {len(all_sequences) - split_idx} validation windows; "
+                         "both splits must be non-empty.")
+
+    past = np.stack([all_sequences[i][0] for i in order]).astype(np.float32)
+    future = np.stack([all_sequences[i][1] for i in order]).astype(np.float32)
+
+    # Per-channel statistics from the training windows only, as in data.py
+    train_concat = np.concatenate([past[:split_idx], future[:split_idx]], axis=2)
+    channel_means = train_concat.mean(axis=(0, 2), keepdims=True)[0]
+    channel_stds = train_concat.std(axis=(0, 2), keepdims=True)[0]
+    channel_stds[channel_stds < 1e-6] = 1e-6
+    past = (past - channel_means) / channel_stds
+    future = (future - channel_means) / channel_stds
+
+    os.makedirs(out_dir, exist_ok=True)
+    arrays = {
+        "train_past": past[:split_idx], "train_future": future[:split_idx],
+        "val_past": past[split_idx:], "val_future": future[split_idx:],
+    }
+    paths = {}
+    for name, arr in arrays.items():
+        paths[name] = os.path.join(out_dir, f"{name}.npy")
+        np.save(paths[name], np.ascontiguousarray(arr))
+    return paths
+
+
+def _init_worker(threads_per_trial):
+    # Limit intra-op threads so parallel trials do not oversubscribe the cores
+    torch.set_num_threads(threads_per_trial)
+
+
+def _forecast_loss(model, past, future, criterion):
+    # Teacher-forced next-step prediction over past + future, used for training;
+    # the loss is computed on the future part only
+    seq = torch.cat([past, future], dim=2)
+    pred = model(seq[:, :, :-1])
+    n_future = future.shape[2]
+    return criterion(pred[:, :, -n_future:], seq[:, :, -n_future:])
+
+
+def _receptive_field(model):
+    # Number of past samples that influence one output of the dilated causal stack
+    return 1 + sum((conv.kernel_size[0] - 1) * conv.dilation[0] for conv in model.filter_convs)
+
+
+def _rollout_loss(model, past, future, criterion, horizon):
+    # Autoregressive forecast seeded with the past window only: each predicted
+    # sample is fed back as input, so no ground-truth future is seen
+    rf = _receptive_field(model)
+    n_past = past.shape[2]
+    buf = torch.empty(past.shape[0], past.shape[1], n_past + horizon, dtype=past.dtype)
+    buf[:, :, :n_past] = past
+    for pos in range(n_past, n_past + horizon):
+        buf[:, :, pos] = model(buf[:, :, max(0, pos - rf):pos])[:, :, -1]
+    return criterion(buf[:, :, n_past:], future[:, :, :horizon])
+
+
+def run_trial(config, paths, epochs, checkpoint, batch_size=16, lr=1e-3, seed=0,
+              val_objective="rollout", val_horizon=None):
+    """
+    Trains one WaveNetForecaster configuration for the given number of epochs,
+    resuming from checkpoint if it exists, and evaluates it on the validation set.
+
+    Training uses teacher-forced next-step prediction. The validation loss
+    depends on val_objective:
+    - "rollout": MSE of an autoregressive forecast of the first val_horizon
+      future samples (default: the whole future window), seeded with the past
+      window only. This is the project's forecasting task.
+    - "teacher_forced": MSE of next-step prediction over the future window
+      given the true preceding samples. Much cheaper, but close to persistence
+      at 500 Hz, so it ranks configurations poorly.
+
+    Returns:
+    result (dict): The configuration with validation loss, training throughput
+        (windows per second) and parameter count.
+    """
+    if val_objective not in ("rollout", "teacher_forced"):
+        raise ValueError(f"Unsupported val_objective '{val_objective}', expected 'rollout' or 'teacher_forced'.")
+    data = {name: np.load(path, mmap_mode="r") for name, path in paths.items()}
+    in_channels = data["train_past"].shape[1]
+    torch.manual_seed(seed)
+    model = WaveNetForecaster(in_channels=in_channels, **config)
+    optimizer = torch.optim.Adam(model.parameters(), lr=lr)
+    criterion = nn.MSELoss()
+
+    done_epochs = 0
+    if os.path.exists(checkpoint):
+        state = torch.load(checkpoint)
+        model.load_state_dict(state["model"])
+        optimizer.load_state_dict(state["optimizer"])
+        done_epochs = state["epochs"]
+    if done_epochs > epochs:
+        raise ValueError(f"Checkpoint {checkpoint} has {done_epochs} epochs, more than the requested {epochs}.")
+
+    rng = np.random.default_rng(seed + done_epochs)
+    n_train = data["train_past"].shape[0]
+    n_seen = 0
+    start = time.perf_counter()
+    model.train()
+    for _ in range(done_epochs, epochs):
+        order = rng.permutation(n_train)
+        for b in range(0, n_train, batch_size):
+            # Sorted indices keep reads from the memory map sequential
+            idx = np.sort(order[b:b + batch_size])
+            past = torch.from_numpy(data["train_past"][idx])
+            future = torch.from_numpy(data["train_future"][idx])
+            optimizer.zero_grad()
+            loss = _forecast_loss(model, past, future, criterion)
+            loss.backward()
+            optimizer.step()
+            n_seen += len(idx)
+    elapsed = time.perf_counter() - start
+    torch.save({"model": model.state_dict(), "optimizer": optimizer.state_dict(), "epochs": epochs}, checkpoint)
+
+    model.eval()
+    total, n_val = 0.0, data["val_past"].shape[0]
+    if n_val == 0:
+        raise ValueError("The validation split is empty.")
+    horizon = data["val_future"].shape[2] if val_horizon is None else val_horizon
+    with torch.no_grad():
+        for b in range(0, n_val, batch_size):
+            past = torch.from_numpy(np.array(data["val_past"][b:b + batch_size]))
+            future = torch.from_numpy(np.array(data["val_future"][b:b + batch_size]))
+            if val_objective == "rollout":
+                loss = _rollout_loss(model, past, future, criterion, horizon)
+            else:
+                loss = _forecast_loss(model, past, future, criterion)
+            total += loss.item() * past.shape[0]
+
+    result = dict(config)
+    result["epochs"] = epochs
+    result["val_loss"] = total / n_val
+    result["windows_per_sec"] = n_seen / elapsed if elapsed > 0 else 0.0
+    result["n_params"] = sum(p.numel() for p in model.parameters())
+    return result
+
+
+def successive_halving(configs, paths, out_dir, min_epochs=1, max_epochs=27, eta=3,
+                       n_workers=None, threads_per_trial=1, val_objective="rollout", val_horizon=None):
+    """
+    Runs a successive halving sweep: all configurations are trained for
+    min_epochs, the best 1/eta are kept and trained further (eta times as many
+    epochs), until max_epochs is reached or one configuration is left.
+
+    Parameters:
+    configs (list): List of WaveNetForecaster keyword-argument dicts.
+    paths (dict): Shared dataset paths returned by prepare_shared_dataset().
+    out_dir (str): Directory for checkpoints and the results table.
+    min_epochs (int): Epochs of the first rung.
+    max_epochs (int): Maximum epochs of any configuration.
+    eta (int): Reduction factor between rungs.
+    n_workers (int or None): Number of parallel trials (default: cores // threads_per_trial).
+    threads_per_trial (int): Torch threads used by each trial.
+    val_objective (str): Validation loss used for pruning, see run_trial().
+    val_horizon (int or None): Future samples forecast by the rollout (default: all).
+
+    Returns:
+    results (list): One result dict per trained (configuration, rung).
+    """
+    if n_workers is None:
+        n_workers = max(1, (os.cpu_count() or 1) // threads_per_trial)
+    os.makedirs(out_dir, exist_ok=True)
+    # Checkpoints are only valid within one sweep; remove those left by a previous run
+    for old_checkpoint in glob.glob(os.path.join(out_dir, "trial_*.pt")):
+        os.remove(old_checkpoint)
+
+    results = []
+    alive = list(range(len(configs)))
+    epochs = min_epochs
+    rung = 0
+    with ProcessPoolExecutor(max_workers=n_workers, initializer=_init_worker,
+                             initargs=(threads_per_trial,)) as pool:
+        while alive:
+            futures = {
+                i: pool.submit(run_trial, configs[i], paths, epochs,
+                               os.path.join(out_dir, f"trial_{i:03d}.pt"),
+                               val_objective=val_objective, val_horizon=val_horizon)
+                for i in alive
+            }
+            rung_results = []
+            for i, future in futures.items():
+                result = future.result()
+                result["trial"] = i
+                result["rung"] = rung
+                rung_results.append(result)
+                print(f"Rung {rung} trial {i} {configs[i]}: val_loss={result['val_loss']:.4f}")
+            results.extend(rung_results)
+
+            if epochs >= max_epochs or len(alive) == 1:
+                break
+            # Keep the best 1/eta configurations for the next rung
+            rung_results.sort(key=lambda r: r["val_loss"])
+            alive = [r["trial"] for r in rung_results[:max(1, len(rung_results) // eta)]]
+            epochs = min(epochs * eta, max_epochs)
+            rung += 1
+
+    write_results(results, os.path.join(out_dir, "results.csv"))
+    return results
+
+
+def write_results(results, path):
+    """
+    Writes the sweep results as a CSV table, one row per (configuration, rung).
+    Rows of different rungs are trained for different numbers of epochs, so
+    validation losses should only be compared within a rung; the best
+    configuration is the best row of the last rung. val_loss is the
+    validation objective chosen in successive_halving() (by default the MSE
+    of an autoregressive forecast of the future window from the past window).
+    """
+    fields = ["trial", "rung", "num_layers", "kernel_size", "residual_channels", "skip_channels",
+              "epochs", "val_loss", "windows_per_sec", "n_params"]
+    with open(path, "w", newline="") as f:
+        writer = csv.DictWriter(f, fieldnames=fields, extrasaction="ignore")
+        writer.writeheader()
+        writer.writerows(results)
+
+
+if __name__ == "__main__":
+    folder = "data"
+    filename = "P1_AllLifts.json"
+    out_dir = "sweep"
+    paths = prepare_shared_dataset(folder, filename, os.path.join(out_dir, "dataset"))
+
+    grid = {
+        "num_layers": [6, 8, 10],
+        "kernel_size": [2, 3],
+        "residual_channels": [16, 32],
+        "skip_channels": [32, 64],
+    }
+    configs = [dict(zip(grid, values)) for values in itertools.product(*grid.values())]
+    results = successive_halving(configs, paths, out_dir, min_epochs=1, max_epochs=9, eta=3,
+                                 threads_per_trial=2)
+    # Only compare models trained for the same number of epochs: pick the best of the final rung
+    final_rung = max(r["rung"] for r in results)
+    best = min((r for r in results if r["rung"] == final_rung), key=lambda r: r["val_loss"])
+    print(f"Best configuration: {best}")